@@ -1,16 +1,33 @@
 import asyncio
-import json
+import bisect
+import orjson
 import pygame
+import struct
 import websockets
 import sys
 import time
-from typing import Dict, List, Optional
+from collections import deque
+from typing import Deque, Dict, Optional
+import numpy as np
+
+try:
+    import uvloop
+except ImportError:  # not available on Windows
+    uvloop = None
 
 pygame.init()
 
 RENDER_FPS = 120
 INTERPOLATION_OFFSET = 0.35
 SERVER_URI = "ws://localhost:8765"
+STATE_BUFFER_SIZE = 40
+INPUT_KEEPALIVE = 1.0
+TEXT_CACHE_SIZE = 256
+
+# Binary state_update layout; must match server.py
+SNAPSHOT_HEADER = struct.Struct('<dHH')    # timestamp, player count, coin count
+SNAPSHOT_PLAYER = struct.Struct('<Hhhi3B') # net_id, x*10, y*10, score, r, g, b
+SNAPSHOT_COIN = struct.Struct('<HHH')      # net_id, x, y
 
 class GameClient:
     def __init__(self):
@@ -22,20 +39,28 @@ class GameClient:
         self.coin_radius: int = 20
         self.game_started = False
         
-        self.state_buffer: List[dict] = []
-        self.current_display_state = {"players": {}, "coins": []}
+        self.state_buffer: Deque[dict] = deque(maxlen=STATE_BUFFER_SIZE)
+        self.state_timestamps: Deque[float] = deque(maxlen=STATE_BUFFER_SIZE)  # parallel to state_buffer, for bisect
+        self.current_display_state = {"players": [], "xy": np.zeros((0, 2), dtype=np.float32), "coins": []}
         
         self.screen: Optional[pygame.Surface] = None
-        self.clock = pygame.time.Clock()
         self.font = pygame.font.SysFont("Arial", 18)
         self.small_font = pygame.font.SysFont("Arial", 14)
+        self._text_cache: Dict[tuple, pygame.Surface] = {}
+        self._info_text: Optional[pygame.Surface] = None
+        self._scores_title: Optional[pygame.Surface] = None
+        self._waiting_text: Optional[pygame.Surface] = None
+        self._coin_surf: Optional[pygame.Surface] = None
+        self._player_surf_cache: Dict[tuple, pygame.Surface] = {}
         
         self.keys_pressed = set()
+        self._last_input = (0, 0)
+        self._last_input_time = 0.0
         self.running = True
         
     async def connect(self):
         try:
-            self.websocket = await websockets.connect(SERVER_URI, ping_interval=None)
+            self.websocket = await websockets.connect(SERVER_URI, ping_interval=None, compression=None)
             print(f"Connected to server at {SERVER_URI}")
         except Exception as e:
             print(f"Failed to connect: {e}")
@@ -44,7 +69,14 @@ class GameClient:
     async def receive_messages(self):
         try:
             async for message in self.websocket:
-                data = json.loads(message)
+                if isinstance(message, bytes):
+                    # Binary frames are always state_update snapshots
+                    snapshot = self.decode_snapshot(message)
+                    self.state_buffer.append(snapshot)
+                    self.state_timestamps.append(snapshot['timestamp'])
+                    continue
+                
+                data = orjson.loads(message)
                 msg_type = data.get('type')
                 
                 if msg_type == 'init':
@@ -56,17 +88,14 @@ class GameClient:
                     
                     if self.screen:
                         self.screen = pygame.display.set_mode((self.game_width, self.game_height))
+                        self.build_sprites()
                         
                     print(f"Initialized as {self.player_id}")
                 
                 elif msg_type == 'game_start':
                     self.game_started = True
+                    self._text_cache.clear()
                     print("Game started!")
-                
-                elif msg_type == 'state_update':
-                    self.state_buffer.append(data)
-                    if len(self.state_buffer) > 40:
-                        self.state_buffer.pop(0)
         
         except websockets.exceptions.ConnectionClosed:
             print("Disconnected from server")
@@ -75,60 +104,78 @@ class GameClient:
             print(f"Receive error: {e}")
             self.running = False
     
+    def decode_snapshot(self, message):
+        view = memoryview(message)
+        timestamp, n_players, n_coins = SNAPSHOT_HEADER.unpack_from(view, 0)
+        players_start = SNAPSHOT_HEADER.size
+        coins_start = players_start + n_players * SNAPSHOT_PLAYER.size
+        coins_end = coins_start + n_coins * SNAPSHOT_COIN.size
+        
+        players = []
+        positions = []
+        for net_id, x, y, score, r, g, b in SNAPSHOT_PLAYER.iter_unpack(view[players_start:coins_start]):
+            players.append({'id': f"player_{net_id}", 'score': score, 'color': (r, g, b)})
+            positions.append((x / 10, y / 10))
+        
+        coins = [
+            {'id': f"coin_{net_id}", 'x': x, 'y': y}
+            for net_id, x, y in SNAPSHOT_COIN.iter_unpack(view[coins_start:coins_end])
+        ]
+        
+        return {
+            'type': 'state_update',
+            'timestamp': timestamp,
+            'players': players,
+            'coins': coins,
+            'ids': [p['id'] for p in players],
+            'xy': np.array(positions, dtype=np.float32).reshape(-1, 2)
+        }
+    
     def get_interpolated_state(self):
-        render_time = time.time() - INTERPOLATION_OFFSET
+        render_time = time.monotonic() - INTERPOLATION_OFFSET
         
         if len(self.state_buffer) < 2:
             if self.state_buffer:
                 latest = self.state_buffer[-1]
-                players_dict = {p['id']: p for p in latest['players']}
-                return {"players": players_dict, "coins": latest['coins']}
+                return {"players": latest['players'], "xy": latest['xy'], "coins": latest['coins']}
             return self.current_display_state
 
         prev_state = None
         next_state = None
 
-        for i in range(len(self.state_buffer) - 1, -1, -1):
-            if self.state_buffer[i]['timestamp'] <= render_time:
-                prev_state = self.state_buffer[i]
-                if i + 1 < len(self.state_buffer):
-                    next_state = self.state_buffer[i+1]
-                break
+        i = bisect.bisect_right(self.state_timestamps, render_time) - 1
+        if i >= 0:
+            prev_state = self.state_buffer[i]
+            if i + 1 < len(self.state_buffer):
+                next_state = self.state_buffer[i+1]
         
         if not prev_state:
             state = self.state_buffer[0]
-            players_dict = {p['id']: p for p in state['players']}
-            return {"players": players_dict, "coins": state['coins']}
+            return {"players": state['players'], "xy": state['xy'], "coins": state['coins']}
             
         if not next_state:
             state = prev_state
-            players_dict = {p['id']: p for p in state['players']}
-            return {"players": players_dict, "coins": state['coins']}
+            return {"players": state['players'], "xy": state['xy'], "coins": state['coins']}
 
         time_diff = next_state['timestamp'] - prev_state['timestamp']
         alpha = 0 if time_diff == 0 else (render_time - prev_state['timestamp']) / time_diff
         
-        interpolated_players = {}
+        prev_xy = prev_state['xy']
+        next_xy = next_state['xy']
         
-        prev_players = {p['id']: p for p in prev_state['players']}
-        next_players = {p['id']: p for p in next_state['players']}
+        # The server sends players sorted by id, so rows line up unless someone joined or left
+        if prev_state['ids'] != next_state['ids']:
+            prev_index = {pid: j for j, pid in enumerate(prev_state['ids'])}
+            aligned = next_xy.copy()
+            for i, pid in enumerate(next_state['ids']):
+                j = prev_index.get(pid)
+                if j is not None:
+                    aligned[i] = prev_xy[j]
+            prev_xy = aligned
         
-        for pid, next_p_data in next_players.items():
-            if pid in prev_players:
-                prev_p_data = prev_players[pid]
-                x = prev_p_data['x'] + (next_p_data['x'] - prev_p_data['x']) * alpha
-                y = prev_p_data['y'] + (next_p_data['y'] - prev_p_data['y']) * alpha
-                
-                interpolated_players[pid] = {
-                    "x": x, "y": y,
-                    "score": next_p_data['score'],
-                    "color": next_p_data.get('color', (255, 255, 255)),
-                    "id": pid
-                }
-            else:
-                interpolated_players[pid] = next_p_data
+        xy = prev_xy + (next_xy - prev_xy) * alpha
 
-        return {"players": interpolated_players, "coins": next_state['coins']}
+        return {"players": next_state['players'], "xy": xy, "coins": next_state['coins']}
     
     async def send_input(self):
         while self.running:
@@ -144,22 +191,62 @@ class GameClient:
                 if pygame.K_DOWN in self.keys_pressed or pygame.K_s in self.keys_pressed:
                     input_y += 1
                 
-                message = {
-                    'type': 'input',
-                    'input_x': input_x,
-                    'input_y': input_y
-                }
-                
-                try:
-                    await self.websocket.send(json.dumps(message))
-                except:
-                    pass
+                # Edge-triggered: only send on change, plus a periodic keepalive
+                now = time.monotonic()
+                if (input_x, input_y) != self._last_input or now - self._last_input_time >= INPUT_KEEPALIVE:
+                    message = {
+                        'type': 'input',
+                        'input_x': input_x,
+                        'input_y': input_y
+                    }
+                    
+                    try:
+                        await self.websocket.send(orjson.dumps(message))
+                        self._last_input = (input_x, input_y)
+                        self._last_input_time = now
+                    except:
+                        pass
             
             await asyncio.sleep(1.0 / 60.0)
     
     def setup_display(self):
         self.screen = pygame.display.set_mode((self.game_width, self.game_height))
         pygame.display.set_caption("Multiplayer Coin Collector")
+        
+        self._info_text = self.font.render("Simulated Latency: 200ms", True, (200, 200, 200))
+        self._scores_title = self.font.render("SCORES:", True, (255, 255, 255))
+        self._waiting_text = self.font.render("Waiting for players...", True, (200, 200, 200))
+        self.build_sprites()
+    
+    def build_sprites(self):
+        # Radii come from the server's init message, so sprites are rebuilt when it arrives
+        r = self.coin_radius
+        self._coin_surf = pygame.Surface((2 * r, 2 * r), pygame.SRCALPHA)
+        pygame.draw.circle(self._coin_surf, (255, 215, 0), (r, r), r)
+        pygame.draw.circle(self._coin_surf, (200, 170, 0), (r, r), r, 1)
+        self._coin_surf = self._coin_surf.convert_alpha()
+        self._player_surf_cache.clear()
+    
+    def player_sprite(self, color):
+        surf = self._player_surf_cache.get(color)
+        if surf is None:
+            r = self.player_radius
+            surf = pygame.Surface((2 * r, 2 * r), pygame.SRCALPHA)
+            pygame.draw.circle(surf, color, (r, r), r)
+            surf = surf.convert_alpha()
+            self._player_surf_cache[color] = surf
+        return surf
+    
+    def render_text(self, text, font, color):
+        # Labels only change when a score does, so rasterize each one once
+        key = (font, text, color)
+        surf = self._text_cache.get(key)
+        if surf is None:
+            if len(self._text_cache) >= TEXT_CACHE_SIZE:
+                self._text_cache.clear()
+            surf = font.render(text, True, color)
+            self._text_cache[key] = surf
+        return surf
     
     def handle_events(self):
         for event in pygame.event.get():
@@ -175,39 +262,37 @@ class GameClient:
         
         render_state = self.get_interpolated_state()
         
+        coin_surf = self._coin_surf
+        r = self.coin_radius
         for coin in render_state['coins']:
-            cx = int(coin['x'])
-            cy = int(coin['y'])
-            pygame.draw.circle(self.screen, (255, 215, 0), (cx, cy), self.coin_radius)
-            pygame.draw.circle(self.screen, (200, 170, 0), (cx, cy), self.coin_radius, 1)
+            self.screen.blit(coin_surf, (int(coin['x']) - r, int(coin['y']) - r))
         
         players = render_state['players']
-        for pid, p in players.items():
+        for p, (x, y) in zip(players, render_state['xy'].tolist()):
+            pid = p['id']
             color = tuple(p.get('color', (255, 100, 100)))
-            center_x = int(p['x'])
-            center_y = int(p['y'])
+            center_x = int(x)
+            center_y = int(y)
             
             if pid == self.player_id:
                 pygame.draw.circle(self.screen, (255, 255, 255), (center_x, center_y), self.player_radius + 3, 2)
             
-            pygame.draw.circle(self.screen, color, (center_x, center_y), self.player_radius)
+            self.screen.blit(self.player_sprite(color), (center_x - self.player_radius, center_y - self.player_radius))
             
-            score_text = self.small_font.render(f"P{pid[-4:]}: {p['score']}", True, (255, 255, 255))
+            score_text = self.render_text(f"P{pid[-4:]}: {p['score']}", self.small_font, (255, 255, 255))
             self.screen.blit(score_text, (center_x - 20, center_y - 35))
 
         if self.game_started:
-            info_text = self.font.render(f"Simulated Latency: 200ms", True, (200, 200, 200))
-            self.screen.blit(info_text, (10, self.game_height - 30))
+            self.screen.blit(self._info_text, (10, self.game_height - 30))
             
             legend_y = 10
             legend_x = 10
-            title = self.font.render("SCORES:", True, (255, 255, 255))
+            title = self._scores_title
             self.screen.blit(title, (legend_x, legend_y))
             legend_x += title.get_width() + 15
             
-            sorted_players = sorted(players.items(), key=lambda x: x[0])
-            
-            for pid, p in sorted_players:
+            for p in players:
+                pid = p['id']
                 if pid == self.player_id:
                     color = (100, 200, 255)
                     name = "YOU"
@@ -215,13 +300,12 @@ class GameClient:
                     color = (255, 100, 100)
                     name = f"P{pid[-4:]}"
                 
-                score_text = self.font.render(f"{name}: {p['score']}", True, color)
+                score_text = self.render_text(f"{name}: {p['score']}", self.font, color)
                 self.screen.blit(score_text, (legend_x, legend_y))
                 legend_x += score_text.get_width() + 15
                 
         else:
-            waiting_text = self.font.render("Waiting for players...", True, (200, 200, 200))
-            self.screen.blit(waiting_text, (self.game_width // 2 - 80, self.game_height // 2))
+            self.screen.blit(self._waiting_text, (self.game_width // 2 - 80, self.game_height // 2))
     
         pygame.display.flip()
 
@@ -232,14 +316,20 @@ class GameClient:
         asyncio.create_task(self.receive_messages())
         asyncio.create_task(self.send_input())
         
+        # Sleep cooperatively for the rest of each frame so websocket reads interleave with renders
+        loop = asyncio.get_running_loop()
+        frame_budget = 1.0 / RENDER_FPS
+        
         while self.running:
+            frame_start = loop.time()
             self.handle_events()
             self.render()
-            self.clock.tick(RENDER_FPS)
-            await asyncio.sleep(0.001)
+            await asyncio.sleep(max(0, frame_budget - (loop.time() - frame_start)))
         
         pygame.quit()
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        uvloop.install()
     client = GameClient()
     asyncio.run(client.run())
\ No newline at end of file
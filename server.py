@@ -1,11 +1,25 @@
 import asyncio
-import json
+import functools
+import math
+import orjson
 import random
+import struct
 import time
 from dataclasses import dataclass, asdict
-from typing import Dict, Set, Optional
+from typing import Dict, List, Set, Optional
+import numpy as np
 import websockets
 
+try:
+    import uvloop
+except ImportError:  # not available on Windows
+    uvloop = None
+
+try:
+    import numba
+except ImportError:  # optional; the NumPy kernel is used instead
+    numba = None
+
 # Configuration
 GAME_WIDTH, GAME_HEIGHT = 500, 375
 PLAYER_RADIUS = 25
@@ -15,20 +29,26 @@ SIMULATION_LATENCY = 0.2
 PLAYER_SPEED = 300  
 TICK_RATE = 120 
 TICK_DELTA = 1.0 / TICK_RATE
+STEP_LEN = PLAYER_SPEED * TICK_DELTA
+SEND_QUEUE_SIZE = 32
+PICKUP_R2 = (PLAYER_RADIUS + COIN_RADIUS) ** 2
 
-# Data classes
-@dataclass
-class Vec2:
-    x: float
-    y: float
-    
-    def distance_to(self, other: 'Vec2') -> float:
-        dx, dy = self.x - other.x, self.y - other.y
-        return (dx*dx + dy*dy) ** 0.5
-    
-    def to_dict(self):
-        return {'x': self.x, 'y': self.y}
+# Binary state_update layout (little-endian); client.py decodes the same structs
+SNAPSHOT_HEADER = struct.Struct('<dHH')    # timestamp, player count, coin count
+SNAPSHOT_PLAYER = struct.Struct('<Hhhi3B') # net_id, x*10, y*10, score, r, g, b
+SNAPSHOT_COIN = struct.Struct('<HHH')      # net_id, x, y
 
+# Control messages (JSON text frames); only player_id varies per connection
+INIT_TEMPLATE = {
+    'type': 'init',
+    'game_width': GAME_WIDTH,
+    'game_height': GAME_HEIGHT,
+    'player_radius': PLAYER_RADIUS,
+    'coin_radius': COIN_RADIUS
+}
+GAME_START_MSG = orjson.dumps({'type': 'game_start'}).decode()
+
+# Data classes
 @dataclass
 class Player:
     id: str
@@ -38,6 +58,7 @@ class Player:
     score: int = 0
     input_x: float = 0
     input_y: float = 0
+    net_id: int = 0
     
     def to_dict(self):
         return {
@@ -53,141 +74,323 @@ class Coin:
     id: str
     x: float
     y: float
+    net_id: int = 0
     
     def to_dict(self):
         return {'id': self.id, 'x': self.x, 'y': self.y}
 
+# Physics kernels
+# Both move every player one tick, clip to the arena, and write the slot of the
+# player collecting each coin into out_hit (-1 if none). Returns the pickup count.
+def _step_numpy(px, py, ivx, ivy, cx, cy, out_hit, width, height, radius, pickup_r2, step_len):
+    mag = np.hypot(ivx, ivy)
+    step = np.divide(step_len, mag, out=np.zeros_like(mag), where=mag > 0)
+    np.clip(px + ivx * step, radius, width - radius, out=px)
+    np.clip(py + ivy * step, radius, height - radius, out=py)
+    
+    out_hit[:] = -1
+    if not len(px) or not len(cx):
+        return 0
+    
+    dx = cx[None, :] - px[:, None]
+    dy = cy[None, :] - py[:, None]
+    hits = dx * dx + dy * dy < pickup_r2
+    collected = hits.any(axis=0)
+    # First player in slot order wins a contested coin
+    out_hit[collected] = np.argmax(hits, axis=0)[collected]
+    return int(np.count_nonzero(collected))
+
+def _step_loops(px, py, ivx, ivy, cx, cy, out_hit, width, height, radius, pickup_r2, step_len):
+    for i in range(px.shape[0]):
+        mag = math.sqrt(ivx[i] * ivx[i] + ivy[i] * ivy[i])
+        step = step_len / mag if mag > 0 else 0.0
+        px[i] = min(max(px[i] + ivx[i] * step, radius), width - radius)
+        py[i] = min(max(py[i] + ivy[i] * step, radius), height - radius)
+    
+    n_hit = 0
+    for j in range(cx.shape[0]):
+        out_hit[j] = -1
+        for i in range(px.shape[0]):
+            dx = cx[j] - px[i]
+            dy = cy[j] - py[i]
+            if dx * dx + dy * dy < pickup_r2:
+                out_hit[j] = i
+                n_hit += 1
+                break
+    return n_hit
+
+if numba is not None:
+    step_physics = numba.njit(cache=True, fastmath=True)(_step_loops)
+else:
+    step_physics = _step_numpy
+
+# Pure-Python kernel specialized for exactly n_players: player loops are unrolled
+# over locals and the arena constants are baked in as literals. Same signature and
+# results as the generic kernels; the trailing scalar arguments are ignored.
+@functools.lru_cache(maxsize=None)
+def make_unrolled_step(n_players):
+    xs = "".join(f"x{i}, " for i in range(n_players))
+    ys = "".join(f"y{i}, " for i in range(n_players))
+    ixs = "".join(f"ix{i}, " for i in range(n_players))
+    iys = "".join(f"iy{i}, " for i in range(n_players))
+    lo, hi_x, hi_y = PLAYER_RADIUS, GAME_WIDTH - PLAYER_RADIUS, GAME_HEIGHT - PLAYER_RADIUS
+    src = [
+        "def step(px, py, ivx, ivy, cx, cy, out_hit, width, height, radius, pickup_r2, step_len, sqrt=sqrt):",
+        f"    {xs}= px.tolist()",
+        f"    {ys}= py.tolist()",
+        f"    {ixs}= ivx.tolist()",
+        f"    {iys}= ivy.tolist()",
+    ]
+    for i in range(n_players):
+        src += [
+            f"    mag = sqrt(ix{i} * ix{i} + iy{i} * iy{i})",
+            f"    s = {STEP_LEN!r} / mag if mag > 0 else 0.0",
+            f"    x{i} = min(max(x{i} + ix{i} * s, {lo!r}), {hi_x!r})",
+            f"    y{i} = min(max(y{i} + iy{i} * s, {lo!r}), {hi_y!r})",
+        ]
+    src += [
+        f"    px[:] = ({xs})",
+        f"    py[:] = ({ys})",
+        "    hits = []",
+        "    for cxj, cyj in zip(cx.tolist(), cy.tolist()):",
+        "        hit = -1",
+    ]
+    for i in range(n_players):
+        keyword = "if" if i == 0 else "elif"
+        src += [
+            f"        {keyword} (cxj - x{i}) * (cxj - x{i}) + (cyj - y{i}) * (cyj - y{i}) < {PICKUP_R2!r}:",
+            f"            hit = {i}",
+        ]
+    src += [
+        "        hits.append(hit)",
+        "    out_hit[:] = hits",
+        "    return len(hits) - hits.count(-1)",
+    ]
+    
+    namespace = {'sqrt': math.sqrt}
+    exec(compile("\n".join(src) + "\n", f"<step_{n_players}>", "exec"), namespace)
+    return namespace['step']
+
+# Client input is untrusted: coerce to a finite float in [-1, 1] or raise ValueError
+def parse_input_axis(value):
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f"non-finite input {value!r}")
+    return max(-1.0, min(1.0, value))
+
 class GameServer:
     def __init__(self):
         self.players: Dict[str, Player] = {}
         self.coins: Dict[str, Coin] = {}
         self.connected_clients: Set[websockets.WebSocketServerProtocol] = set()
         self.player_id_map: Dict[websockets.WebSocketServerProtocol, str] = {}
-        self.last_coin_spawn = time.time()
+        self.send_queues: Dict[websockets.WebSocketServerProtocol, asyncio.Queue] = {}
+        self._last_payload: Optional[tuple] = None
+        self.last_coin_spawn = time.monotonic()
         self.coin_counter = 0
         self.game_started = False
         self.start_time = None
         self.stop_event = asyncio.Event()
         
+        # Structure-of-arrays mirror of players/coins for the tick hot path
+        self._player_slots: Dict[str, int] = {}
+        self._slot_players: List[Player] = []
+        self._px = np.zeros(0, dtype=np.float32)
+        self._py = np.zeros(0, dtype=np.float32)
+        self._ivx = np.zeros(0, dtype=np.float32)
+        self._ivy = np.zeros(0, dtype=np.float32)
+        self._slot_coins: List[Coin] = []
+        self._cx = np.zeros(0, dtype=np.float32)
+        self._cy = np.zeros(0, dtype=np.float32)
+        self._coin_hits = np.zeros(0, dtype=np.int32)
+        self._step_kernel = step_physics
+        self._step_physics()  # compile the Numba kernel up front rather than on the first tick
+    
+    def _step_physics(self):
+        return self._step_kernel(
+            self._px, self._py, self._ivx, self._ivy, self._cx, self._cy, self._coin_hits,
+            GAME_WIDTH, GAME_HEIGHT, PLAYER_RADIUS, PICKUP_R2, STEP_LEN
+        )
+    
+    def _specialize_step(self):
+        # The Numba kernel has no interpreter overhead left to remove
+        if numba is None and self.game_started and self._slot_players:
+            self._step_kernel = make_unrolled_step(len(self._slot_players))
+        else:
+            self._step_kernel = step_physics
+    
+    def _sync_player_arrays(self):
+        # Sorted by id so clients can interpolate consecutive snapshots row by row
+        self._slot_players = sorted(self.players.values(), key=lambda p: p.id)
+        self._player_slots = {p.id: i for i, p in enumerate(self._slot_players)}
+        self._px = np.array([p.x for p in self._slot_players], dtype=np.float32)
+        self._py = np.array([p.y for p in self._slot_players], dtype=np.float32)
+        self._ivx = np.array([p.input_x for p in self._slot_players], dtype=np.float32)
+        self._ivy = np.array([p.input_y for p in self._slot_players], dtype=np.float32)
+        self._specialize_step()
+    
+    def _sync_coin_arrays(self):
+        self._slot_coins = list(self.coins.values())
+        self._cx = np.array([c.x for c in self._slot_coins], dtype=np.float32)
+        self._cy = np.array([c.y for c in self._slot_coins], dtype=np.float32)
+        self._coin_hits = np.empty(len(self._slot_coins), dtype=np.int32)
+    
     async def spawn_coin(self):
         coin_id = f"coin_{self.coin_counter}"
+        net_id = self.coin_counter & 0xFFFF
         self.coin_counter += 1
         
         x = random.randint(COIN_RADIUS, GAME_WIDTH - COIN_RADIUS)
         y = random.randint(COIN_RADIUS, GAME_HEIGHT - COIN_RADIUS)
         
-        self.coins[coin_id] = Coin(id=coin_id, x=x, y=y)
+        self.coins[coin_id] = Coin(id=coin_id, x=x, y=y, net_id=net_id)
+        self._sync_coin_arrays()
         return coin_id
     
     async def update_game_state(self):
-        current_time = time.time()
+        current_time = time.monotonic()
         
         if current_time - self.last_coin_spawn > COIN_SPAWN_INTERVAL:
             await self.spawn_coin()
             self.last_coin_spawn = current_time
         
-        for player in self.players.values():
-            mag = (player.input_x**2 + player.input_y**2) ** 0.5
-            if mag > 0:
-                vx = (player.input_x / mag) * PLAYER_SPEED
-                vy = (player.input_y / mag) * PLAYER_SPEED
-            else:
-                vx, vy = 0, 0
-            
-            new_x = player.x + vx * TICK_DELTA
-            new_y = player.y + vy * TICK_DELTA
-            
-            player.x = max(PLAYER_RADIUS, min(GAME_WIDTH - PLAYER_RADIUS, new_x))
-            player.y = max(PLAYER_RADIUS, min(GAME_HEIGHT - PLAYER_RADIUS, new_y))
+        players = self._slot_players
         
-        coins_to_remove = []
-        for coin_id, coin in self.coins.items():
-            for player in self.players.values():
-                dist = ((coin.x - player.x)**2 + (coin.y - player.y)**2) ** 0.5
-                if dist < PLAYER_RADIUS + COIN_RADIUS:
-                    player.score += 1
-                    coins_to_remove.append(coin_id)
-                    break
+        if self._step_physics():
+            coins = self.coins
+            slot_coins = self._slot_coins
+            for coin_slot, player_slot in enumerate(self._coin_hits.tolist()):
+                if player_slot >= 0:
+                    players[player_slot].score += 1
+                    del coins[slot_coins[coin_slot].id]
+            self._sync_coin_arrays()
         
-        for coin_id in coins_to_remove:
-            del self.coins[coin_id]
+        for player, x, y in zip(players, self._px.tolist(), self._py.tolist()):
+            player.x = x
+            player.y = y
     
     async def broadcast_state(self):
         if not self.game_started:
             return
         
-        state = {
-            'type': 'state_update',
-            'timestamp': time.time(),
-            'players': [p.to_dict() for p in self.players.values()],
-            'coins': [c.to_dict() for c in self.coins.values()]
-        }
+        # Serialized once per tick; every relay shares the same bytes object
+        timestamp = time.monotonic()
+        frame = (self.encode_snapshot(timestamp), timestamp)
+        self._last_payload = frame
         
-        message = json.dumps(state)
+        for out_q in self.send_queues.values():
+            try:
+                out_q.put_nowait(frame)
+            except asyncio.QueueFull:
+                out_q.get_nowait()  # drop the oldest frame
+                out_q.put_nowait(frame)
+    
+    def encode_snapshot(self, timestamp):
+        players = self._slot_players
+        coins = self._slot_coins
+        buf = bytearray(
+            SNAPSHOT_HEADER.size
+            + len(players) * SNAPSHOT_PLAYER.size
+            + len(coins) * SNAPSHOT_COIN.size
+        )
         
-        if self.connected_clients:
-            async def delayed_send(client):
-                try:
-                    await asyncio.sleep(SIMULATION_LATENCY)
-                    await client.send(message)
-                except:
-                    pass
-            
-            await asyncio.gather(
-                *[delayed_send(client) for client in self.connected_clients],
-                return_exceptions=True
-            )
+        SNAPSHOT_HEADER.pack_into(buf, 0, timestamp, len(players), len(coins))
+        offset = SNAPSHOT_HEADER.size
+        
+        pack_player, player_size = SNAPSHOT_PLAYER.pack_into, SNAPSHOT_PLAYER.size
+        for p in players:
+            r, g, b = p.color
+            pack_player(buf, offset, p.net_id, round(p.x * 10), round(p.y * 10), p.score, r, g, b)
+            offset += player_size
+        
+        pack_coin, coin_size = SNAPSHOT_COIN.pack_into, SNAPSHOT_COIN.size
+        for c in coins:
+            pack_coin(buf, offset, c.net_id, c.x, c.y)
+            offset += coin_size
+        
+        return bytes(buf)
+    
+    async def relay(self, websocket, out_q):
+        pending = None
+        try:
+            while True:
+                message, sent_at = pending or await out_q.get()
+                pending = None
+                delay = sent_at + SIMULATION_LATENCY - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                
+                # Coalesce: if newer frames are already due, only the freshest is worth sending
+                while not out_q.empty():
+                    next_message, next_sent_at = out_q.get_nowait()
+                    if next_sent_at + SIMULATION_LATENCY > time.monotonic():
+                        pending = (next_message, next_sent_at)
+                        break
+                    message = next_message
+                
+                await websocket.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
     
     async def handle_client(self, websocket):
-        player_id = f"player_{len(self.players)}"
+        net_id = len(self.players)
+        player_id = f"player_{net_id}"
         
         player = Player(
             id=player_id,
+            net_id=net_id,
             x=random.uniform(PLAYER_RADIUS, GAME_WIDTH - PLAYER_RADIUS),
             y=random.uniform(PLAYER_RADIUS, GAME_HEIGHT - PLAYER_RADIUS),
             color=(random.randint(50, 255), random.randint(50, 255), random.randint(50, 255))
         )
         self.players[player_id] = player
+        self._sync_player_arrays()
         self.connected_clients.add(websocket)
         self.player_id_map[websocket] = player_id
         
-        init_msg = {
-            'type': 'init',
-            'player_id': player_id,
-            'game_width': GAME_WIDTH,
-            'game_height': GAME_HEIGHT,
-            'player_radius': PLAYER_RADIUS,
-            'coin_radius': COIN_RADIUS
-        }
-        await websocket.send(json.dumps(init_msg))
+        init_msg = {**INIT_TEMPLATE, 'player_id': player_id}
+        await websocket.send(orjson.dumps(init_msg).decode())
         print(f"Player {player_id} connected. Total players: {len(self.players)}")
         
         if len(self.players) == 2 and not self.game_started:
             self.game_started = True
-            self.start_time = time.time()
+            self.start_time = time.monotonic()
+            self._specialize_step()
             print("Game started!")
             
             for _ in range(5):
                 await self.spawn_coin()
             
-            start_msg = {'type': 'game_start'}
             await asyncio.gather(
-                *[c.send(json.dumps(start_msg)) for c in self.connected_clients],
+                *[c.send(GAME_START_MSG) for c in self.connected_clients],
                 return_exceptions=True
             )
         elif self.game_started:
-            await websocket.send(json.dumps({'type': 'game_start'}))
+            await websocket.send(GAME_START_MSG)
+        
+        out_q = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        if self._last_payload is not None:
+            out_q.put_nowait(self._last_payload)
+        self.send_queues[websocket] = out_q
+        relay_task = asyncio.create_task(self.relay(websocket, out_q))
+        
+        in_q = asyncio.Queue()
+        input_task = asyncio.create_task(self.input_relay(websocket, in_q))
         
         try:
             async for message in websocket:
-                asyncio.create_task(self.process_delayed_message(websocket, message))
+                in_q.put_nowait((time.monotonic(), message))
         
         except websockets.exceptions.ConnectionClosed:
             pass
         finally:
+            relay_task.cancel()
+            input_task.cancel()
+            del self.send_queues[websocket]
             self.connected_clients.discard(websocket)
             if player_id in self.players:
                 del self.players[player_id]
+                self._sync_player_arrays()
             del self.player_id_map[websocket]
             print(f"Player {player_id} disconnected. Total players: {len(self.players)}")
             
@@ -195,16 +398,30 @@ class GameServer:
                 print("All players disconnected. Shutting down server...")
                 self.stop_event.set()
 
-    async def process_delayed_message(self, websocket, message):
+    async def input_relay(self, websocket, in_q):
+        while True:
+            received_at, message = await in_q.get()
+            delay = received_at + SIMULATION_LATENCY - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.process_message(websocket, message)
+    
+    def process_message(self, websocket, message):
         try:
-            await asyncio.sleep(SIMULATION_LATENCY)
-            data = json.loads(message)
+            data = orjson.loads(message)
             
             if data['type'] == 'input':
                 pid = self.player_id_map.get(websocket)
                 if pid in self.players:
-                    self.players[pid].input_x = data.get('input_x', 0)
-                    self.players[pid].input_y = data.get('input_y', 0)
+                    # Validate both axes before touching any state
+                    input_x = parse_input_axis(data.get('input_x', 0))
+                    input_y = parse_input_axis(data.get('input_y', 0))
+                    player = self.players[pid]
+                    player.input_x = input_x
+                    player.input_y = input_y
+                    slot = self._player_slots[pid]
+                    self._ivx[slot] = input_x
+                    self._ivy[slot] = input_y
         except Exception as e:
             print(f"Error processing message: {e}")
     
@@ -220,7 +437,10 @@ async def main():
     
     loop_task = asyncio.create_task(server.game_loop())
     
-    async with websockets.serve(server.handle_client, "localhost", 8765):
+    async with websockets.serve(
+        server.handle_client, "localhost", 8765,
+        compression=None, ping_interval=None, ping_timeout=None
+    ):
         print("Server running on ws://localhost:8765")
         print("Waiting for 2 players to connect...")
         try:
@@ -231,4 +451,6 @@ async def main():
             print("Shutting down...")
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        uvloop.install()
     asyncio.run(main())
\ No newline at end of file